@@ -39,7 +39,7 @@ class Example(Client):
         print(json.dumps(resp, indent = 4))
 
     def subscribe_transactions(self):
-        self.send({
+        self.send_nowait({
             'command': 'subscribe',
             'streams': ['transactions']
         })
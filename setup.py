@@ -15,9 +15,18 @@ NAME = "xrpl_websocket"
 
 install_requires = [
     'websocket-client==0.56.0',
-    'wsaccel'
+    'wsaccel',
+    'futures; python_version < "3.2"',
+    'orjson; python_version >= "3.6"'
 ]
 
+extras_require = {
+    'asyncio': [
+        'websockets>=10.0',
+        'uvloop; platform_system != "Windows"'
+    ]
+}
+
 setup(
     name=NAME,
     version=VERSION,
@@ -31,6 +40,7 @@ setup(
     zip_safe=True,
     python_requires='>=2.6, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*',
     install_requires=install_requires,
+    extras_require=extras_require,
     classifiers=[
         "Development Status :: 4 - Beta",
         'License :: OSI Approved :: Apache Software License',
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# coding: utf-8
+import asyncio
+import logging
+import time
+from threading import Thread
+
+import websockets
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from .client import BaseClient, _loads, _dumps
+from .exceptions import (
+    ResponseFormatError, TimeoutError, NotConnectedError, DisconnectedError
+)
+
+
+def _encode(payload):
+    """Encode a payload as a text frame
+    :param payload:
+    :return:
+    """
+    data = _dumps(payload)
+    # bytes would be sent as a binary frame by websockets
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return data
+
+
+class AsyncClient(BaseClient):
+    """
+    asyncio client, reading, decoding and dispatching messages on a single
+    event loop. Ping/pong is handled by the websockets library.
+    """
+
+    available_callbacks = [
+        'on_open', 'on_close', 'on_error',
+        'on_transaction', 'on_validation', 'on_ledger',
+        'on_manifest'
+    ]
+
+    # static payloads, encoded once
+    _SUBSCRIBE_LEDGER_FRAME = _encode({'command': 'subscribe', 'id': 'ledger', 'streams': ['ledger']})
+
+    def __init__(self, server=None, timeout=None, log_level=None, **kwargs):
+        """
+        Args:
+            server: rippled node url.
+            timeout: connection timeout seconds
+            log_level: loggin level
+            kwargs: callbacks, as for Client, except on_reconnect
+
+        Callbacks are called on the event loop: plain functions must not
+        block, coroutine functions are scheduled as tasks.
+        """
+        BaseClient.__init__(self, server, timeout, log_level, **kwargs)
+
+        # running callback tasks
+        self._tasks = set()
+
+        # Connection Handling Attributes
+        self._closing = False
+        self._closed = None
+        self._loop = None
+        self._thread = None
+
+    async def run(self):
+        """
+        Connects and handles received data, reconnecting at
+        reconnect_interval until close() is called.
+
+        :return:
+        """
+        self._loop = asyncio.get_event_loop()
+        self._closed = asyncio.Event()
+        if self._closing:
+            return
+
+        while not self._closing:
+            self.log.debug("Starting Connection..")
+            try:
+                async with websockets.connect(
+                    self.server,
+                    open_timeout=self.connection_timeout,
+                    ping_interval=self.ping_interval,
+                    ping_timeout=self.pong_timeout,
+                    max_size=None,
+                    max_queue=None
+                ) as socket:
+                    self.socket = socket
+
+                    # close() was called during the handshake
+                    if self._closing:
+                        break
+
+                    await self._on_open()
+
+                    async for message in socket:
+                        self._on_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.info("Connection Error - %s", e)
+                if not self._closing:
+                    self._callback('on_error', e)
+            finally:
+                self._on_close()
+
+            if not self._closing:
+                self.log.info("Attempting to connect again in %s seconds.",
+                              self.reconnect_interval)
+                try:
+                    await asyncio.wait_for(self._closed.wait(), self.reconnect_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def close(self):
+        """
+        Closes the websocket connection and stops run().
+
+        :return:
+        """
+        self.log.debug("Disconnecting from API..")
+        self._closing = True
+        if self._closed is not None:
+            self._closed.set()
+        if self.socket:
+            await self.socket.close()
+
+    async def send(self, payload=None, **kwargs):
+        """
+        Sends the given Payload to the API and waits for the response.
+
+        :param payload:
+        :param kwargs: payload parameters as key=value pairs
+        :return:
+        """
+        _payload = payload if payload else kwargs
+
+        if not 'id' in _payload:
+            _payload['id'] = next(self._id_counter)
+
+        future = self._loop.create_future()
+        self._pending[_payload['id']] = future
+        try:
+            await self.send_nowait(_payload)
+            return await asyncio.wait_for(future, self.response_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError('timeout on sending payload!', _payload)
+        finally:
+            self._pending.pop(_payload['id'], None)
+
+    async def send_nowait(self, payload=None, **kwargs):
+        """
+        Sends the given Payload to the API without waiting for a response,
+        e.g. for subscribe commands.
+
+        :param payload:
+        :param kwargs: payload parameters as key=value pairs
+        :return: payload id
+        """
+        _payload = payload if payload else kwargs
+
+        if not 'id' in _payload:
+            _payload['id'] = next(self._id_counter)
+
+        if self.socket is None:
+            raise NotConnectedError('client not connected', _payload)
+
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Sending payload to API: %s", _payload)
+
+        await self.socket.send(_encode(_payload))
+        return _payload['id']
+
+    def connect(self, nowait=True):
+        """
+        Runs the client on its own event loop in a background thread, for
+        use from synchronous code.
+
+        :return:
+        """
+        # the loop exists before the thread starts, so disconnect() and
+        # send_sync() can be called right away
+        self._loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        self._thread = Thread(target=self._run_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+        if not nowait:
+            return self.connected.wait()
+
+    def disconnect(self):
+        """
+        Stops a client started with connect() and joins its thread.
+
+        :return:
+        """
+        if self._thread is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self.close(), self._loop)
+        self._thread.join(timeout=self.response_timeout)
+
+    def send_sync(self, payload=None, **kwargs):
+        """
+        Sends the given Payload from another thread than the event loop and
+        blocks until the response arrives.
+
+        :param payload:
+        :param kwargs: payload parameters as key=value pairs
+        :return:
+        """
+        return asyncio.run_coroutine_threadsafe(self.send(payload, **kwargs), self._loop).result()
+
+    def _run_loop(self):
+        """
+        Main method of the background thread.
+
+        :return:
+        """
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.run())
+        finally:
+            # cancel what is left, like asyncio.run()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    async def _on_open(self):
+        self.log.info("Connection opened")
+        await self.socket.send(self._SUBSCRIBE_LEDGER_FRAME)
+        self.connected.set()
+
+        self._callback('on_open', self)
+
+    def _on_close(self):
+        self.log.info("Connection closed")
+        self.connected.clear()
+        self.socket = None
+
+        # nothing will answer requests sent on this connection anymore
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(DisconnectedError('connection closed', None))
+
+        self._callback('on_close')
+
+    def _on_message(self, message):
+        """
+        Decodes and passes received data to the appropriate handlers.
+
+        :return:
+        """
+        received_at = time.time()
+        try:
+            data = _loads(message)
+        except ValueError:
+            # Something wrong with this data, log and discard
+            return
+
+        if isinstance(data, dict):
+            # This is a valid message
+            try:
+                self._data_handler(data, received_at)
+            except ResponseFormatError as e:
+                self.log.error("Invalid response: %s", e)
+            except Exception as e:
+                # don't let one message drop the connection
+                self.log.error("error handling message %s: %s", message, e)
+
+    def _response_handler(self, data, ts):
+        """Handles responses from socket
+        :param data:
+        :param ts:
+        :return:
+        """
+        future = self._pending.pop(data['id'], None)
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def _emit(self, _callback, *args):
+        """Call a callback, scheduling it as a task if it is a coroutine
+        :param _callback:
+        :param *args:
+        :return:
+        """
+        try:
+            result = _callback(*args)
+        except Exception as e:
+            self.log.error("error from callback %s: %s", _callback, e)
+            return
+
+        if asyncio.iscoroutine(result):
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task):
+        """Log errors from callback tasks
+        :param task:
+        :return:
+        """
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error("error from callback %s: %s", task, task.exception())
@@ -3,20 +3,208 @@
 import logging
 import time
 import json
-import sys, inspect
-import random, uuid
-from multiprocessing import Queue
-from threading import Thread, Event, Timer
+import socket
+import sys
+import itertools
+from threading import Thread, Event, Lock
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+try:
+    from queue import SimpleQueue as Queue, Empty
+except ImportError:
+    try:
+        from queue import Queue, Empty
+    except ImportError:
+        # python 2
+        from Queue import Queue, Empty
 
 import websocket
 
+try:
+    import orjson
+
+    # rippled sends amounts wider than 64 bits as strings, so orjson's
+    # float fallback for such integers doesn't apply
+    _loads = orjson.loads
+
+    def _dumps(payload):
+        # websocket.send accepts the encoded bytes as-is
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # integers out of the 64 bits range, or types neither supports
+            return json.dumps(payload)
+except ImportError:
+    _loads = json.loads
+    _dumps = json.dumps
+
+try:
+    _string_types = (basestring,)
+except NameError:
+    _string_types = (str,)
+
+# python 2 has no monotonic clock
+_monotonic = getattr(time, 'monotonic', time.time)
+
 from .exceptions import ResponseFormatError, TimeoutError
 
-class Client(Thread):
+class BaseClient(object):
+    """
+    Callback handling, message dispatch and state shared by the clients.
+    """
+
+    # callbacks which can be passed as keyword arguments or defined on a
+    # subclass
+    available_callbacks = [
+        'on_open', 'on_reconnect', 'on_close', 'on_error',
+        'on_transaction', 'on_validation', 'on_ledger',
+        'on_manifest'
+    ]
+
+    def __init__(self, server=None, timeout=None, log_level=None, **kwargs):
+        """
+        Args:
+            server: rippled node url.
+            timeout: connection timeout seconds
+            log_level: loggin level
+            kwargs: callbacks, see available_callbacks
+        """
+
+        # assing any callback method
+        for key,value in kwargs.items():
+            if(key in self.available_callbacks):
+                setattr(self, key, value)
+
+        # resolve callbacks once instead of looking them up on every event
+        self._callbacks = {}
+        for key in self.available_callbacks:
+            _callback = getattr(self, key, None)
+            if _callback is not None and callable(_callback):
+                self._callbacks[key] = _callback
+
+        # the busiest streams skip the generic dispatch
+        self._transaction_callback = self._callbacks.get('on_transaction')
+        self._ledger_callback = self._callbacks.get('on_ledger')
+
+        # other stream events which are passed straight to a callback
+        self._stream_callbacks = {
+            'validationReceived': self._callbacks.get('on_validation'),
+            'manifestReceived': self._callbacks.get('on_manifest'),
+        }
+
+        self.socket = None
+        self.server = server if server else 'wss://xrpl.ws'
+
+        # pending send() requests, keyed by payload id
+        self._id_counter = itertools.count(1)
+        self._pending = {}
+
+        # ledger status
+        self._ledgerVersion = None
+        self._fee_base = None
+        self._fee_ref = None
+
+        # Connection Handling Attributes
+        self.connected = Event()
+        self.reconnect_interval = 10
+
+        self.ping_interval = 10
+        self.pong_timeout = 30
+        self.connection_timeout = timeout if timeout else 30
+        self.response_timeout = timeout if timeout else 30
+
+        # Logging stuff
+        self.log = logging.getLogger(self.__module__)
+        logging.basicConfig(stream=sys.stdout, format="[%(filename)s:%(lineno)s - %(funcName)10s() : %(message)s")
+        self.log.setLevel(level=log_level if log_level else logging.ERROR)
+
+    def _data_handler(self, data, ts):
+        """
+        Distributes system messages to the appropriate handler.
+        System messages include everything that arrives as a dict,
+
+        :param data:
+        :param ts:
+        :return:
+        """
+        # Unpack the data
+        event = data.get('type')
+
+        if event == 'transaction':
+            if self._transaction_callback is not None:
+                self._emit(self._transaction_callback, data)
+
+        # if data is reponse to send command
+        elif event == 'response':
+            if not data.get('id'):
+                raise ResponseFormatError('valid id not found in response', data)
+            self._response_handler(data, ts)
+
+        # a malformed, unhashable type can't be looked up
+        elif isinstance(event, _string_types) and event in self._stream_callbacks:
+            _callback = self._stream_callbacks[event]
+            if _callback is not None:
+                self._emit(_callback, data)
+        elif event == 'ledgerClosed':
+            self._ledger_handler(data, ts)
+        elif not event or data.get('error'):
+            # Error handling
+            # Todo: Should be handle the error
+            self.log.error("error event: %s %s %s", data.get('error'), data.get('error_message'), data)
+        else:
+            self.log.error("Unhandled event: %s, data: %s", event, data)
+
+    def _ledger_handler(self, data, ts):
+        """Save ledger state
+        :param data:
+        :param ts:
+        :return:
+        """
+        self._ledgerVersion = data.get('ledger_index')
+        self._fee_base = data.get('fee_base')
+        self._fee_ref = data.get('fee_ref')
+
+        # emit callback
+        if self._ledger_callback is not None:
+            self._emit(self._ledger_callback, data)
+
+    def _response_handler(self, data, ts):
+        """Handles responses from socket
+        :param data:
+        :param ts:
+        :return:
+        """
+        raise NotImplementedError
+
+    def _callback(self, callback, *args):
+        """Emit a callback by name
+        :param callback:
+        :param *args:
+        :return:
+        """
+        _callback = self._callbacks.get(callback)
+        if _callback is not None:
+            self._emit(_callback, *args)
+
+    def _emit(self, _callback, *args):
+        """Emit a resolved callback
+        :param _callback:
+        :param *args:
+        :return:
+        """
+        raise NotImplementedError
+
+
+class Client(BaseClient, Thread):
     """
     Higher level of APIs are provided.
     The interface is like JavaScript WebSocket object.
     """
+
+    # static payloads, encoded once
+    _SUBSCRIBE_LEDGER_FRAME = _dumps({'command': 'subscribe', 'id': 'ledger', 'streams': ['ledger']})
+    _PING_FRAME = _dumps({'command': 'ping', 'id': 'ping'})
+
     def __init__(self, server=None, timeout=None, log_level=None, *args, **kwargs):
         """
         Args:
@@ -32,56 +220,49 @@ class Client(Thread):
             on_validation: callback object by the validations stream when the server receives a validation message
             on_manifest: callback object sent by the manifests stream when the server receives a manifest.
         """
+        BaseClient.__init__(self, server, timeout, log_level, **kwargs)
 
-        # assing any callback method
-        available_callbacks = [
-            'on_open','on_reconnect', 'on_close','on_error',
-            'on_transaction', 'on_validation', 'on_ledger',
-            'on_manifest'
-       ]
-
-        for key,value in kwargs.items():
-            if(key in available_callbacks):
-                setattr(self, key, value)
+        self._pending_lock = Lock()
 
-        self.socket = None
-        self.server = server if server else 'wss://xrpl.ws'
-        self.responseEvents = dict()
-        self.q = Queue()
+        # callbacks are emitted in order by a single worker thread
+        self._callback_queue = Queue()
+        self._callback_thread = Thread(target=self._callback_worker)
+        self._callback_thread.daemon = True
 
-        # ledger status
-        self._ledgerVersion = None
-        self._fee_base = None
-        self._fee_ref = None
+        # received messages are decoded in batches by a single worker thread
+        self.receive_batch_size = 64
+        self._receive_queue = Queue()
+        self._receive_thread = Thread(target=self._receive_worker)
+        self._receive_thread.daemon = True
 
         # Connection Handling Attributes
-        self.connected = Event()
         self.disconnect_called = Event()
         self.reconnect_required = Event()
-        self.reconnect_interval = 10
         self.paused = Event()
 
+        # kernel receive buffer, large enough to absorb ledger close bursts
+        # (capped by net.core.rmem_max on linux)
+        self.receive_buffer_size = 4 * 1024 * 1024
+
         # Setup Timer attributes
+        # Timers are monotonic deadlines fired by a single scheduler thread
+        self._timers_lock = Lock()
+        self._timers_wakeup = Event()
+        self._scheduler_thread = Thread(target=self._scheduler_worker)
+        self._scheduler_thread.daemon = True
+
         # Tracks API Connection & Responses
-        self.ping_timer = None
-        self.ping_interval = 10
+        self._ping_deadline = None
 
         # Tracks Websocket Connection
-        self.connection_timer = None
-        self.connection_timeout = timeout if timeout else 30
-        self.response_timeout = timeout if timeout else 30
+        self._connection_deadline = None
 
         # Tracks responses from send_ping()
-        self.pong_timer = None
+        self._pong_deadline = None
         self.pong_received = False
-        self.pong_timeout = 30
 
-        # Logging stuff
-        self.log = logging.getLogger(self.__module__)
-        logging.basicConfig(stream=sys.stdout, format="[%(filename)s:%(lineno)s - %(funcName)10s() : %(message)s")
         if log_level == logging.DEBUG:
             websocket.enableTrace(True)
-        self.log.setLevel(level=log_level if log_level else logging.ERROR)
 
         # Call init of Thread and pass remaining args and kwargs
         Thread.__init__(self)
@@ -112,9 +293,14 @@ class Client(Thread):
 
         # stop timers
         self._stop_timers()
+        self._timers_wakeup.set()
 
         self.join(timeout=1)
 
+        # stop the workers after pending messages and callbacks are handled
+        self._receive_queue.put(None)
+        self._callback_queue.put(None)
+
     def reconnect(self):
         """
         Issues a reconnection by setting the reconnect_required event.
@@ -144,19 +330,33 @@ class Client(Thread):
         )
 
         self.log.debug("Starting Connection..")
-        self.socket.run_forever()
+        self._run_forever()
 
         while self.reconnect_required.is_set():
             if not self.disconnect_called.is_set():
-                self.log.info("Attempting to connect again in %s seconds."
-                              % self.reconnect_interval)
+                self.log.info("Attempting to connect again in %s seconds.",
+                              self.reconnect_interval)
                 self.state = "unavailable"
                 time.sleep(self.reconnect_interval)
 
                 # We need to set this flag since closing the socket will
                 # set it to False
                 self.socket.keep_running = True
-                self.socket.run_forever()
+                self._run_forever()
+
+    def _run_forever(self):
+        """
+        Runs the websocket event loop until the connection is closed.
+
+        :return:
+        """
+        # payloads are validated by the JSON decoder anyway, and ping/pong
+        # is handled by our own timers
+        self.socket.run_forever(
+            sockopt=((socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size),),
+            skip_utf8_validation=True,
+            ping_interval=0
+        )
 
     def run(self):
         """
@@ -165,11 +365,14 @@ class Client(Thread):
         :return:
         """
         self.log.debug("Starting up..")
+        self._callback_thread.start()
+        self._receive_thread.start()
+        self._scheduler_thread.start()
         self._connect()
 
     def _on_message(self, message):
         """
-        Handles and passes received data to the appropriate handlers.
+        Queues received data for the receive worker.
 
         :return:
         """
@@ -178,22 +381,56 @@ class Client(Thread):
         if self.disconnect_called.is_set():
             return
 
+        self._receive_queue.put((message, time.time()))
 
-        raw, received_at = message, time.time()
-        self.log.debug("Received new message %s at %s", raw, received_at)
-
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            # Something wrong with this data, log and discard
-            return
-
-        if isinstance(data, dict):
-            # This is a valid message
-            self._data_handler(data, received_at)
+    def _receive_worker(self):
+        """
+        Decodes received data in batches and passes it to the appropriate
+        handlers, until a None sentinel is received.
 
-        # We've received data, reset timers
-        self._start_timers()
+        :return:
+        """
+        while True:
+            batch = [self._receive_queue.get()]
+            while len(batch) < self.receive_batch_size:
+                try:
+                    batch.append(self._receive_queue.get_nowait())
+                except Empty:
+                    break
+
+            debug = self.log.isEnabledFor(logging.DEBUG)
+            for item in batch:
+                if item is None:
+                    return
+
+                # ignore income messages if we are disconnecting
+                if self.disconnect_called.is_set():
+                    continue
+
+                raw, received_at = item
+                if debug:
+                    self.log.debug("Received new message %s at %s", raw, received_at)
+
+                try:
+                    data = _loads(raw)
+                except ValueError:
+                    # Something wrong with this data, log and discard
+                    continue
+
+                if isinstance(data, dict):
+                    # This is a valid message
+                    try:
+                        self._data_handler(data, received_at)
+                    except ResponseFormatError as e:
+                        self.log.error("Invalid response: %s", e)
+                    except Exception as e:
+                        # keep the worker alive, nothing else reads the queue
+                        self.log.error("error handling message %s: %s", raw, e)
+
+            # We've received data, reset timers, unless the connection was
+            # closed while this batch was queued
+            if self.connected.is_set():
+                self._start_timers()
 
     def _on_close(self, *args):
         self.log.info("Connection closed")
@@ -232,7 +469,7 @@ class Client(Thread):
         :return:
         """
         self.log.debug("Subscribe to ledger changes...")
-        self.socket.send(json.dumps(dict(command='subscribe', id=1, streams=['ledger'])))
+        self.socket.send(self._SUBSCRIBE_LEDGER_FRAME)
 
     def _stop_timers(self):
         """
@@ -240,14 +477,10 @@ class Client(Thread):
 
         :return:
         """
-        if self.ping_timer:
-            self.ping_timer.cancel()
-
-        if self.connection_timer:
-            self.connection_timer.cancel()
-
-        if self.pong_timer:
-            self.pong_timer.cancel()
+        with self._timers_lock:
+            self._ping_deadline = None
+            self._connection_deadline = None
+            self._pong_deadline = None
         self.log.debug("Timers stopped.")
 
     def _start_timers(self):
@@ -257,16 +490,71 @@ class Client(Thread):
         :return:
         """
         self.log.debug("Resetting timers..")
-        self._stop_timers()
+        now = _monotonic()
+
+        with self._timers_lock:
+            # _on_close() clears connected before stopping the timers, so a
+            # late reset from the receive worker can't re-arm them
+            if not self.connected.is_set():
+                return
+
+            # deadlines only move later while armed, so the scheduler only
+            # needs waking up when they were stopped
+            stopped = self._ping_deadline is None or self._connection_deadline is None
+
+            # Sends a ping at ping_interval to see if API still responding
+            self._ping_deadline = now + self.ping_interval
 
-        # Sends a ping at ping_interval to see if API still responding
-        self.ping_timer = Timer(self.ping_interval, self.send_ping)
-        self.ping_timer.start()
+            # Automatically reconnect if we did not receive data
+            self._connection_deadline = now + self.connection_timeout
 
-        # Automatically reconnect if we did not receive data
-        self.connection_timer = Timer(self.connection_timeout,
-                                      self._connection_timed_out)
-        self.connection_timer.start()
+            self._pong_deadline = None
+
+        if stopped:
+            self._timers_wakeup.set()
+
+    def _scheduler_worker(self):
+        """
+        Fires the ping, pong and connection timers once their deadlines have
+        passed, until disconnect is called.
+
+        :return:
+        """
+        while not self.disconnect_called.is_set():
+            self._timers_wakeup.clear()
+            now = _monotonic()
+
+            due = []
+            with self._timers_lock:
+                if self._ping_deadline is not None and self._ping_deadline <= now:
+                    self._ping_deadline = None
+                    due.append(self.send_ping)
+
+                if self._connection_deadline is not None and self._connection_deadline <= now:
+                    self._connection_deadline = None
+                    due.append(self._connection_timed_out)
+
+                if self._pong_deadline is not None and self._pong_deadline <= now:
+                    self._pong_deadline = None
+                    due.append(self._check_pong)
+
+            for timer in due:
+                try:
+                    timer()
+                except Exception as e:
+                    self.log.error("error from timer %s: %s", timer, e)
+
+            with self._timers_lock:
+                deadlines = [deadline for deadline in (
+                    self._ping_deadline,
+                    self._connection_deadline,
+                    self._pong_deadline
+                ) if deadline is not None]
+
+            if deadlines:
+                self._timers_wakeup.wait(max(min(deadlines) - _monotonic(), 0))
+            else:
+                self._timers_wakeup.wait()
 
     def send_ping(self):
         """
@@ -275,9 +563,10 @@ class Client(Thread):
         :return:
         """
         self.log.debug("Sending ping to API..")
-        self.socket.send(json.dumps(dict(command='ping', id='ping')))
-        self.pong_timer = Timer(self.pong_timeout, self._check_pong)
-        self.pong_timer.start()
+        self.socket.send(self._PING_FRAME)
+        with self._timers_lock:
+            self._pong_deadline = _monotonic() + self.pong_timeout
+        self._timers_wakeup.set()
 
     def _check_pong(self):
         """
@@ -285,7 +574,6 @@ class Client(Thread):
 
        :return:
         """
-        self.pong_timer.cancel()
         if self.pong_received:
             self.log.debug("Pong received in time.")
             self.pong_received = False
@@ -310,27 +598,51 @@ class Client(Thread):
             _payload = kwargs
 
         if not 'id' in _payload:
-            _payload['id'] = str(uuid.uuid4())
+            _payload['id'] = next(self._id_counter)
 
+        # register the future before sending, so the response can't
+        # arrive before we are waiting for it
+        future = Future()
+        with self._pending_lock:
+            self._pending[_payload['id']] = future
 
-        self.log.debug("Sending payload to API: %s", payload)
+        try:
+            self.send_nowait(_payload)
+            return future.result(timeout=self.response_timeout)
+        except FutureTimeoutError:
+            raise TimeoutError('timeout on sending payload!', _payload)
+        finally:
+            # never keep a future around for a response that didn't arrive
+            with self._pending_lock:
+                self._pending.pop(_payload['id'], None)
+
+    def send_nowait(self, payload=None, **kwargs):
+        """
+        Sends the given Payload to the API without waiting for a response,
+        e.g. for subscribe commands.
+
+        :param payload:
+        :param kwargs: payload parameters as key=value pairs
+        :return: payload id
+        """
+
+        if payload:
+            _payload = payload
+        else:
+            _payload = kwargs
+
+        if not 'id' in _payload:
+            _payload['id'] = next(self._id_counter)
+
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Sending payload to API: %s", _payload)
 
         try:
-            self.socket.send(json.dumps(_payload))
+            self.socket.send(_dumps(_payload))
         except websocket.WebSocketConnectionClosedException:
-            self.log.error("Did not send out payload %s - client not connected. ", kwargs)
-
-        event = Event()
-        self.responseEvents[_payload.get('id')] = event
+            self.log.error("Did not send out payload %s - client not connected. ", _payload)
 
-        while not event.is_set():
-            emitted = event.wait(self.response_timeout)
-            if(emitted):
-                resp = self.q.get(1)
-                if(resp['id'] == _payload['id']):
-                    return resp
-            else:
-                raise TimeoutError('timeout on sending payload!', _payload)
+        return _payload['id']
 
     def _connection_timed_out(self):
         """
@@ -371,78 +683,40 @@ class Client(Thread):
         self.log.debug("Received a pong message!")
         self.pong_received = True
 
-    def _data_handler(self, data, ts):
-        """
-        Distributes system messages to the appropriate handler.
-        System messages include everything that arrives as a dict,
-
+    def _response_handler(self, data, ts):
+        """Handles responses from socket
         :param data:
         :param ts:
         :return:
         """
-        # Unpack the data
-        event = data.get('type')
-
-        # if data is reponse to send command
-        if event == 'response':
-            if not data.get('id'):
-                raise ResponseFormatError('valid id not found in response', data)
-            if(data.get('id') == 'ping'):
-                self._pong_handler()
-            else:
-                self._response_handler(data, ts)
+        if data['id'] == 'ping':
+            self._pong_handler()
+            return
 
-        elif event == 'ledgerClosed':
-            self._ledger_handler(data, ts)
-        elif event == 'transaction':
-            self._callback('on_transaction', data)
-        elif event == 'validationReceived':
-            self._callback('on_validation', data)
-        elif event == 'manifestReceived':
-            self._callback('on_manifest', data)
-        elif not event or data.get('error'):
-            # Error handling
-            # Todo: Should be handle the error
-            self.log.error('error', data.error, data.error_message, data)
-        else:
-            self.log.error("Unhandled event: %s, data: %s", event, data)
+        with self._pending_lock:
+            future = self._pending.pop(data['id'], None)
+        if future is not None:
+            future.set_result(data)
 
-    def _ledger_handler(self, data, ts):
-        """Save ledger state
-        :param data:
-        :param ts:
+    def _emit(self, _callback, *args):
+        """Queue a callback to be emitted by the callback worker
+        :param _callback:
+        :param *args:
         :return:
         """
-        self._ledgerVersion = data.get('ledger_index')
-        self._fee_base = data.get('fee_base')
-        self._fee_ref = data.get('fee_ref')
-
-        # emit callback
-        self._callback('on_ledger', data)
+        self._callback_queue.put((_callback, args))
 
-    def _response_handler(self, data, ts):
-        """Handles responses from socket
-        :param data:
-        :param ts:
+    def _callback_worker(self):
+        """Emit queued callbacks until a None sentinel is received
         :return:
         """
-        event = self.responseEvents.pop(data.get('id'), None)
-        if(event):
-            self.q.put(data)
-            event.set()
+        while True:
+            item = self._callback_queue.get()
+            if item is None:
+                break
 
-    def _callback(self, callback, *args):
-        """Emit a callback in a thread
-        :param callback:
-        :param *args:
-        :return:
-        """
-        if callback:
+            _callback, args = item
             try:
-                _callback = getattr(self, callback, None)
-                if _callback is not None and callable(_callback):
-                    t = Thread(target=_callback, args=args)
-                    t.setDaemon(True)
-                    t.start()
+                _callback(*args)
             except Exception as e:
-                self.log.error("error from callback {}: {}".format(_callback, e))
+                self.log.error("error from callback %s: %s", _callback, e)